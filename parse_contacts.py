@@ -1,28 +1,96 @@
 #!/usr/bin/env python3
+"""
+parse_contacts.py
+Parses every *.html file in the current directory into contact_details.json.
+
+Only the standard library is required (google-re2 and orjson are used if
+installed), so the script also runs unchanged under PyPy, whose JIT suits the
+per-file loop:
+
+    python3 parse_contacts.py
+    pypy3 parse_contacts.py
+"""
 import os
 import json
+import mmap
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Patterns used on every file, compiled once at import
+_CAMEL_SPLIT_RE = re.compile(r'(.)([A-Z][a-z]+)')
+_CAMEL_LOWER_UPPER_RE = re.compile(r'([a-z0-9])([A-Z])')
+
+# Address components, matched against the stripped text
+_POSTCODE_RE = re.compile(r'\b([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9]?[A-Za-z]))))\s?[0-9][A-Za-z]{2})\b')
+# Contains street/road/court/avenue etc
+_STREET_RE = re.compile(r'\b(?:Street|Road|Way|Close|Avenue|Drive|Crescent|Court|Terrace|Place|Lane|Gardens|Square|Park|Hill|Walk)\b')
+# Contains House/Building/Centre etc
+_BUILDING_RE = re.compile(r'\b(?:House|Building|Centre|Office|Suite|Floor|Level)\b')
+# Common town names, in priority order: the first one found anywhere wins
+_TOWNS = ('Macclesfield', 'Crewe')
+_TOWNS_RE = re.compile(r'\b(' + '|'.join(_TOWNS) + r')\b')
+
+# Raw HTML patterns
+_TAG_RE = re.compile(r'<[^>]+>')
+# These run over untrusted HTML. The email parts are capped at their RFC 5321
+# lengths so that the backtracking engine stays linear on long runs of address
+# characters with no '@'. Emails and telephone numbers are scanned separately
+# because a number can sit inside an address (info.01625378286@...) and both
+# should be reported.
+_EMAIL_PATTERN = r'\b([a-zA-Z0-9._%+-]{1,64}@[a-zA-Z0-9.-]{1,253}\.[a-zA-Z]{2,63})\b'
+_PHONE_PATTERN = r'\b(?:0\d{10}|\+44\d{10}|\(0\d{2}\)\s*\d{3}\s*\d{4}|0\d{4}\s*\d{3}\s*\d{3})\b'
+# The characters the local part may contain; see find_emails
+_EMAIL_LOCAL_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-')
+_EMAIL_RE = re.compile(_EMAIL_PATTERN)
+_PHONE_RE = re.compile(_PHONE_PATTERN)
+# When google-re2 is installed its linear-time engine takes over, but only for
+# ASCII documents: RE2's \b and \s ignore non-ASCII letters and spaces (so
+# 'éabc@...' would match and '01625\xa0378\xa0286' would not). \s is spelled
+# out to keep the ASCII control characters Python's \s also accepts.
+if re2 is not None:
+    _ASCII_EMAIL_RE = re2.compile(_EMAIL_PATTERN)
+    _ASCII_PHONE_RE = re2.compile(_PHONE_PATTERN.replace(r'\s', r'[\t\n\v\f\r\x1c-\x1f ]'))
+else:
+    _ASCII_EMAIL_RE = _EMAIL_RE
+    _ASCII_PHONE_RE = _PHONE_RE
+# RE2 cannot compile this lookahead
+_WEBSITE_RE = re.compile(r'https?://[^\s"\']+(?=&|$)')
+
+# Below this size a plain read() is cheaper than setting up a mapping
+_MMAP_MIN_SIZE = 1024 * 1024
+
+# A file parses in well under a millisecond, so starting worker processes only
+# pays off once there are this many files and more than one CPU to run them
+_POOL_MIN_FILES = 500
+
 def camel_to_title(name):
     """Convert CamelCase to Title Case"""
-    s1 = re.sub(r'(.)([A-Z][a-z]+)', r'\1 \2', name)
-    return re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', s1).title()
+    s1 = _CAMEL_SPLIT_RE.sub(r'\1 \2', name)
+    return _CAMEL_LOWER_UPPER_RE.sub(r'\1 \2', s1).title()
 
 def extract_address_parts(text):
-    """Extract address components from text"""
-    # Postcode pattern
-    postcode_pattern = r'\b([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9]?[A-Za-z]))))\s?[0-9][A-Za-z]{2})\b'
+    """Extract address components from text
     
-    # Street pattern (contains street/road/court/avenue etc)
-    street_pattern = r'\b(?:Street|Road|Way|Close|Avenue|Drive|Crescent|Court|Terrace|Place|Lane|Gardens|Square|Park|Hill|Walk)\b'
-    
-    # Building pattern (contains House/Building/Centre etc)
-    building_pattern = r'\b(?:House|Building|Centre|Office|Suite|Floor|Level)\b'
-    
-    # Common town names
-    common_towns = [r'\bMacclesfield\b', r'\bCrewe\b']
+    Every copy of a component is removed before the next one is read:
     
+    >>> extract_address_parts('Foo SK10 1EA Bar SK10 1EA Baz Road')['street']
+    'Foo  Bar  Baz Road'
+    >>> extract_address_parts('AB1 2CD x AB1 2CD Road')['street']
+    'x Road'
+    """
     postcode = None
     street = None
     building = None
@@ -30,31 +98,31 @@ def extract_address_parts(text):
     county = None
     
     # Find postcode first
-    postcode_match = re.search(postcode_pattern, text)
+    postcode_match = _POSTCODE_RE.search(text)
     if postcode_match:
         postcode = postcode_match.group(0)
         text = text.replace(postcode, '').strip()
     
     # Find street
-    street_match = re.search(street_pattern, text)
+    street_match = _STREET_RE.search(text)
     if street_match:
         # Extract the street line
-        parts = text.split(street_match.group(0))
-        if len(parts) > 1:
-            street = f"{parts[0].strip()} {street_match.group(0)}".strip()
-            text = text.replace(street, '').strip()
+        keyword = street_match.group(0)
+        street = f"{text[:text.find(keyword)].strip()} {keyword}".strip()
+        text = text.replace(street, '').strip()
     
     # Find building
-    building_match = re.search(building_pattern, text)
+    building_match = _BUILDING_RE.search(text)
     if building_match:
-        building = f"{text.split(building_match.group(0))[0].strip()} {building_match.group(0)}".strip()
+        keyword = building_match.group(0)
+        building = f"{text[:text.find(keyword)].strip()} {keyword}".strip()
         text = text.replace(building, '').strip()
     
     # Find city (Macclesfield or Crewe)
-    for town_pattern in common_towns:
-        town_match = re.search(town_pattern, text)
-        if town_match:
-            city = town_match.group(0)
+    found_towns = set(_TOWNS_RE.findall(text))
+    for town in _TOWNS:
+        if town in found_towns:
+            city = town
             text = text.replace(city, '').strip()
             # If Cheshire is found, set county to None
             if 'Cheshire' in text:
@@ -71,14 +139,74 @@ def extract_address_parts(text):
         'remaining': text
     }
 
+def map_html_file(f):
+    """Map a large file read-only instead of copying it; small files are just read"""
+    if os.fstat(f.fileno()).st_size >= _MMAP_MIN_SIZE:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return nullcontext(f.read())
+
+def find_emails(email_re, text):
+    """Return the emails email_re finds in text, skipping truncated hits
+    
+    With the local part capped, an over-long address can still match from a
+    later word boundary inside it, which would report a different mailbox.
+    Such hits start right after another local-part character and are dropped
+    (RE2 has no lookbehind, so this is checked here rather than in the pattern):
+    
+    >>> find_emails(_EMAIL_RE, 'first.' * 15 + 'last@example.com')
+    []
+    >>> find_emails(_EMAIL_RE, 'mail first.last@example.com now')
+    ['first.last@example.com']
+    """
+    emails = []
+    for match in email_re.finditer(text):
+        start = match.start()
+        if start and text[start - 1] in _EMAIL_LOCAL_CHARS:
+            continue
+        emails.append(match.group(1))
+    return emails
+
+def decode_html(raw):
+    """Decode file bytes the way open(filepath, 'r', encoding='utf-8') reads them
+    
+    Strict UTF-8, with \\r\\n and lone \\r turned into \\n so that $ in the
+    patterns still matches at the end of CRLF and CR files:
+    
+    >>> decode_html(b'<p>Visit</p>\\r\\nhttps://example.com/page\\r\\n')
+    '<p>Visit</p>\\nhttps://example.com/page\\n'
+    >>> decode_html(b'<p>x</p>\\rhttps://example.com/a\\r')
+    '<p>x</p>\\nhttps://example.com/a\\n'
+    """
+    return str(raw, 'utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
 def parse_html_file(filepath):
     """Parse a single HTML file for contact information"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # Decode the whole file strictly so that invalid UTF-8 anywhere, tags
+    # included, is reported rather than silently stripped
+    with open(filepath, 'rb') as f, map_html_file(f) as raw:
+        content = decode_html(raw)
     
     # Extract text content (strip HTML tags)
-    text_content = re.sub(r'<[^>]+>', ' ', content)
-    text_content = re.sub(r'\s+', ' ', text_content).strip()
+    text_content = _TAG_RE.sub(' ', content)
+    text_content = ' '.join(text_content.split())
+    
+    if content.isascii():
+        email_re, phone_re = _ASCII_EMAIL_RE, _ASCII_PHONE_RE
+    else:
+        email_re, phone_re = _EMAIL_RE, _PHONE_RE
+    
+    # Extract emails
+    emails = find_emails(email_re, content)
+    email_list = [{'label': None, 'email': email} for email in emails]
+    
+    # Extract telephone numbers
+    phones = phone_re.findall(content)
+    phone_list = [{'label': None, 'telephone': phone} for phone in phones]
+    
+    # Extract website (keep before &pageTitle)
+    website = _WEBSITE_RE.search(content)
+    website_url = website.group(0) if website else None
+    website_list = [{'label': None, 'website': website_url}] if website_url else []
     
     # Extract address components
     address_parts = extract_address_parts(text_content)
@@ -94,22 +222,6 @@ def parse_html_file(filepath):
     county = address_parts['county']
     postcode = address_parts['postcode']
     
-    # Extract emails
-    email_pattern = r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
-    emails = re.findall(email_pattern, content)
-    email_list = [{'label': None, 'email': email} for email in emails]
-    
-    # Extract telephone numbers
-    phone_pattern = r'\b(?:0\d{10}|\+44\d{10}|\(0\d{2}\)\s*\d{3}\s*\d{4}|0\d{4}\s*\d{3}\s*\d{3})\b'
-    phones = re.findall(phone_pattern, content)
-    phone_list = [{'label': None, 'telephone': phone} for phone in phones]
-    
-    # Extract website (keep before &pageTitle)
-    website_pattern = r'https?://[^\s"\']+(?=&pageTitle|&|$)'
-    website = re.search(website_pattern, content)
-    website_url = website.group(0) if website else None
-    website_list = [{'label': None, 'website': website_url}] if website_url else []
-    
     # Create JSON structure
     contact = {
         "entryThumbnail": None,
@@ -135,6 +247,45 @@ def parse_html_file(filepath):
     
     return contact
 
+def dump_record(contact):
+    """Serialise one contact exactly as json.dumps(contact, indent=2) would"""
+    if orjson is not None:
+        return orjson.dumps(contact, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(contact, indent=2, ensure_ascii=False)
+
+def try_parse_html_file(filepath):
+    """Parse a single HTML file, returning (contact, error) instead of raising"""
+    try:
+        return parse_html_file(filepath), None
+    except Exception as e:
+        return None, e
+
+def try_parse_html_chunk(filepaths):
+    """Parse a batch of files in one worker call"""
+    return [try_parse_html_file(filepath) for filepath in filepaths]
+
+def parse_html_files(html_files):
+    """Yield (contact, error) for each file in order, in parallel when worthwhile"""
+    cpu_count = os.cpu_count() or 1
+    if cpu_count == 1 or len(html_files) < _POOL_MIN_FILES:
+        yield from map(try_parse_html_file, html_files)
+        return
+    
+    # Files are independent, so parse them across all cores. Executor.map would
+    # queue every chunk up front and hold finished results until they are read,
+    # so keep only a couple of chunks per worker in flight instead.
+    chunksize = max(1, len(html_files) // (cpu_count * 4))
+    max_pending = cpu_count * 2
+    pending = deque()
+    with ProcessPoolExecutor() as executor:
+        for start in range(0, len(html_files), chunksize):
+            chunk = html_files[start:start + chunksize]
+            pending.append(executor.submit(try_parse_html_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
 def main():
     """Main function to parse all HTML files"""
     html_dir = Path(".")
@@ -142,21 +293,33 @@ def main():
     
     print(f"Processing {len(html_files)} HTML files...")
     
-    contacts = []
-    for html_file in html_files:
-        try:
-            contact = parse_html_file(html_file)
-            contacts.append(contact)
-            print(f"✓ Processed {html_file.name}")
-        except Exception as e:
-            print(f"✗ Error processing {html_file.name}: {e}")
-    
-    # Save to JSON
+    # Records are written as they arrive rather than collected first; the
+    # layout matches json.dump(contacts, f, indent=2). They go to a temporary
+    # file that only replaces the real one once every file has been handled,
+    # so a crash or Ctrl-C mid-run leaves the previous output intact.
     output_file = "contact_details.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(contacts, f, indent=2, ensure_ascii=False)
+    temp_file = f"{output_file}.tmp"
+    saved = 0
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for html_file, (contact, error) in zip(html_files, parse_html_files(html_files)):
+                if error is not None:
+                    print(f"✗ Error processing {html_file.name}: {error}")
+                    continue
+                record = dump_record(contact)
+                f.write(',\n  ' if saved else '\n  ')
+                f.write(record.replace('\n', '\n  '))
+                saved += 1
+                print(f"✓ Processed {html_file.name}")
+            f.write('\n]' if saved else ']')
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
     
-    print(f"\n✓ Saved {len(contacts)} records to {output_file}")
+    print(f"\n✓ Saved {saved} records to {output_file}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file